@@ -1,7 +1,17 @@
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 import json
+import os
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时回退到标准库json
+    orjson = None
 
 # ========== 核心配置（gov-purchase-table项目） ==========
 CONFIG = {
@@ -28,43 +38,99 @@ CONFIG = {
 }
 
 
+# HTML表格行/单元格模板
+ROW_TMPL = "<tr class='{cls}' {attrs} id='{tid}-row-{i}'>{cells}</tr>"
+CELL_TMPL = "<td>{}</td>"
+
+
+# HTML转义表（str.translate单次扫描完成全部替换）
+HTML_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#x27;"
+})
+
+
+@lru_cache(maxsize=4096)
+def escape_html(val):
+    """转义HTML特殊字符（筛选列取值重复度高，缓存转义结果）"""
+    return str(val).translate(HTML_ESCAPE_TABLE)
+
+
+@lru_cache(maxsize=4096)
+def option_html(val):
+    """生成筛选下拉框的option标签"""
+    escaped = escape_html(val)
+    return f"<option value='{escaped}'>{escaped}</option>"
+
+
 # ========== 数据处理工具函数 ==========
 def load_history_data():
-    """加载历史数据用于判断重复内容"""
+    """加载历史数据用于判断重复内容（标题以字典键存储，便于O(1)查找）"""
     try:
         if Path(CONFIG["history_data_path"]).exists():
-            with open(CONFIG["history_data_path"], "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {"purchase_notice": [], "purchase_intention": []}
+            if orjson is not None:
+                history_data = orjson.loads(Path(CONFIG["history_data_path"]).read_bytes())
+            else:
+                with open(CONFIG["history_data_path"], "r", encoding="utf-8") as f:
+                    history_data = json.load(f)
+            # 兼容旧版以列表保存的历史记录
+            for key in ("purchase_notice", "purchase_intention"):
+                titles = history_data.get(key, {})
+                if isinstance(titles, list):
+                    history_data[key] = dict.fromkeys(titles, 1)
+            return history_data
+        return {"purchase_notice": {}, "purchase_intention": {}}
     except Exception as e:
         print(f"加载历史数据失败：{str(e)}")
-        return {"purchase_notice": [], "purchase_intention": []}
+        return {"purchase_notice": {}, "purchase_intention": {}}
 
 
-def save_history_data(notice_titles, intention_titles):
-    """保存当前数据到历史记录"""
+def save_history_data(notice_titles, intention_titles, notice_sig="", intention_sig="", script_sig=""):
+    """保存当前数据到历史记录（同时记录CSV文件和脚本自身的签名，用于判断输入是否变化）"""
     try:
         history_data = {
-            "purchase_notice": notice_titles,
-            "purchase_intention": intention_titles,
+            # 标题统一转为字符串作为键，与filter_duplicates中的比较方式一致
+            "purchase_notice": dict.fromkeys(map(str, notice_titles), 1),
+            "purchase_intention": dict.fromkeys(map(str, intention_titles), 1),
+            "notice_sig": notice_sig,
+            "intention_sig": intention_sig,
+            "script_sig": script_sig,
             "last_updated": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
-        with open(CONFIG["history_data_path"], "w", encoding="utf-8") as f:
-            json.dump(history_data, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            Path(CONFIG["history_data_path"]).write_bytes(
+                orjson.dumps(history_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        else:
+            with open(CONFIG["history_data_path"], "w", encoding="utf-8") as f:
+                json.dump(history_data, f, ensure_ascii=False, indent=2)
         print("历史数据已更新")
     except Exception as e:
         print(f"保存历史数据失败：{str(e)}")
 
 
-def filter_duplicates(df, unique_key, history_list):
+def get_file_signature(file_path):
+    """根据文件大小和修改时间生成签名，文件不存在时返回空字符串"""
+    try:
+        stat = Path(file_path).stat()
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return ""
+
+
+def filter_duplicates(df, unique_key, history_titles):
     """过滤重复内容，并标记新增内容"""
-    # 标记新增内容
-    df['is_new'] = df[unique_key].apply(lambda x: x not in history_list)
-    # 返回去重后的DataFrame
-    df = df.drop_duplicates(subset=[unique_key], keep='first')
-    # 新增数据置顶
-    df = df.sort_values(by='is_new', ascending=False, ignore_index=True)
-    return df
+    # 去重：只保留每个标题第一次出现的行
+    df = df[~df.duplicated(subset=[unique_key], keep='first')]
+    # 标记新增内容（转为集合后用isin做哈希查找，避免逐行扫描列表）
+    # 历史记录以JSON字符串键保存，标题按字符串比较，数字标题也能正确匹配
+    history_set = set(map(str, history_titles))
+    is_new = ~df[unique_key].astype(str).isin(history_set).to_numpy()
+    # 新增数据置顶：布尔值只需线性划分，各组内保持原有相对顺序
+    order = np.concatenate([np.flatnonzero(is_new), np.flatnonzero(~is_new)])
+    return df.iloc[order].assign(is_new=is_new[order]).reset_index(drop=True)
 
 
 def parse_time_column(df, time_col):
@@ -72,30 +138,34 @@ def parse_time_column(df, time_col):
     if time_col not in df.columns:
         return df
 
-    def parse_time(time_str):
-        if pd.isna(time_str) or time_str in ["无数据", "未知", ""]:
-            return pd.NaT
-        # 尝试多种时间格式
-        formats = [
-            '%Y-%m-%d %H:%M:%S',
-            '%Y-%m-%d',
-            '%Y/%m/%d',
-            '%Y年%m月%d日',
-            '%m-%d-%Y',
-            '%d/%m/%Y'
-        ]
-        for fmt in formats:
-            try:
-                return pd.to_datetime(time_str, format=fmt)
-            except:
-                continue
-        # 自动解析
-        try:
-            return pd.to_datetime(time_str, errors='ignore')
-        except:
-            return pd.NaT
-
-    df[f'{time_col}_parsed'] = df[time_col].apply(parse_time)
+    def to_datetime(values, fmt):
+        # 统一按UTC解析（带时区偏移与不带时区的值可以混在同一列），再去掉时区信息
+        return pd.to_datetime(values, errors='coerce', format=fmt, utc=True).dt.tz_localize(None)
+
+    # 占位值视为空值，其余整列交给pandas向量化解析
+    raw = df[time_col]
+    s = raw.where(~raw.isin(["无数据", "未知", ""]))
+    parsed = to_datetime(s, 'ISO8601')
+
+    # 尝试多种时间格式（按格式循环，只解析仍未成功的行）
+    formats = [
+        '%Y/%m/%d',
+        '%Y年%m月%d日',
+        '%m-%d-%Y',
+        '%d/%m/%Y'
+    ]
+    for fmt in formats:
+        mask = parsed.isna() & s.notna()
+        if not mask.any():
+            break
+        parsed = parsed.combine_first(to_datetime(s[mask], fmt))
+
+    # 自动解析剩余行
+    mask = parsed.isna() & s.notna()
+    if mask.any():
+        parsed = parsed.combine_first(to_datetime(s[mask], 'mixed'))
+
+    df[f'{time_col}_parsed'] = parsed
     return df
 
 
@@ -109,6 +179,18 @@ def generate_online_html_table():
     # 1. 加载历史数据
     history_data = load_history_data()
 
+    # CSV和生成脚本都未发生变化且HTML已存在时，直接跳过本次生成
+    notice_sig = get_file_signature(CONFIG["purchase_notice"]["csv_path"])
+    intention_sig = get_file_signature(CONFIG["purchase_intention"]["csv_path"])
+    script_sig = get_file_signature(__file__)
+    if (notice_sig and intention_sig and script_sig
+            and history_data.get("notice_sig") == notice_sig
+            and history_data.get("intention_sig") == intention_sig
+            and history_data.get("script_sig") == script_sig
+            and Path(CONFIG["html_output_path"]).exists()):
+        print("ℹ️ CSV文件和脚本均未发生变化，跳过生成")
+        return
+
     # 2. 安全读取CSV文件
     def read_csv_safe(csv_path, headers):
         try:
@@ -127,35 +209,26 @@ def generate_online_html_table():
             print(f"❌ 读取CSV失败 {csv_path}：{str(e)}")
             return pd.DataFrame(columns=headers)
 
-    # 读取两份CSV
-    df_notice = read_csv_safe(
-        CONFIG["purchase_notice"]["csv_path"],
-        CONFIG["purchase_notice"]["headers"]
-    )
-    df_intention = read_csv_safe(
-        CONFIG["purchase_intention"]["csv_path"],
-        CONFIG["purchase_intention"]["headers"]
-    )
+    # 单张表的处理流程：读取CSV → 解析时间列 → 过滤重复内容并标记新增
+    def build_table(table_key):
+        table_config = CONFIG[table_key]
 
-    # 解析时间列（用于排序）
-    df_notice = parse_time_column(df_notice, CONFIG["purchase_notice"]["time_col"])
-    df_intention = parse_time_column(df_intention, CONFIG["purchase_intention"]["time_col"])
+        df = read_csv_safe(table_config["csv_path"], table_config["headers"])
+        # 解析时间列（用于排序）
+        df = parse_time_column(df, table_config["time_col"])
+        # 过滤重复内容并标记新增
+        return filter_duplicates(df, table_config["unique_key"], history_data.get(table_key, {}).keys())
+
+    # 3. 两张表互不依赖，放到线程池并行处理（pandas解析时会释放GIL）
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        notice_future = executor.submit(build_table, "purchase_notice")
+        intention_future = executor.submit(build_table, "purchase_intention")
+        df_notice = notice_future.result()
+        df_intention = intention_future.result()
 
-    # 3. 过滤重复内容并标记新增
     notice_key = CONFIG["purchase_notice"]["unique_key"]
     intention_key = CONFIG["purchase_intention"]["unique_key"]
 
-    df_notice = filter_duplicates(
-        df_notice,
-        notice_key,
-        history_data.get("purchase_notice", [])
-    )
-    df_intention = filter_duplicates(
-        df_intention,
-        intention_key,
-        history_data.get("purchase_intention", [])
-    )
-
     # 提取当前所有标题用于更新历史记录
     current_notice_titles = df_notice[notice_key].tolist()
     current_intention_titles = df_intention[intention_key].tolist()
@@ -230,21 +303,20 @@ def generate_online_html_table():
                 if col not in df.columns:
                     continue
 
-                unique_vals = sorted(df[col].drop_duplicates().tolist())
-                if "无数据" in unique_vals:
-                    unique_vals.remove("无数据")
-                    unique_vals.insert(0, "无数据")
-                if "未分类" in unique_vals:
-                    unique_vals.remove("未分类")
-                    unique_vals.insert(1, "未分类")
+                # 哈希去重后排序，"无数据"/"未分类"固定排在最前
+                vals = df[col].unique().tolist()
+                vals.sort()
+                val_set = set(vals)
+                special_vals = ("无数据", "未分类")
+                unique_vals = [v for v in special_vals if v in val_set]
+                unique_vals.extend(v for v in vals if v not in special_vals)
 
                 filter_html.append(f"<div class='filter-group'>")
                 filter_html.append(f"<label class='filter-label'>{col}：</label>")
                 filter_html.append(
                     f"<select class='filter-select' id='filter-{table_id}-{col}' onchange='filterTable(\"{table_id}\")'>")
                 filter_html.append(f"<option value='all'>全部</option>")
-                for val in unique_vals:
-                    filter_html.append(f"<option value='{val}'>{val}</option>")
+                filter_html.extend(option_html(val) for val in unique_vals)
                 filter_html.append(f"</select>")
                 filter_html.append(f"</div>")
 
@@ -274,80 +346,94 @@ def generate_online_html_table():
 
     # 6. 生成带功能的表格HTML
     def df_to_html_with_features(df, table_id, link_col="详情链接", unique_key="标题", filter_cols=[], time_col=""):
-        df_html = df.copy()
+        parsed_col = f'{time_col}_parsed'
+        cols = [col for col in df.columns if col not in ['is_new', parsed_col]]
+        n_rows = len(df)
+        is_new_arr = df['is_new'].to_numpy(dtype=bool) if 'is_new' in df.columns else np.zeros(n_rows, dtype=bool)
+
+        # 各列取出为本地数组后再加工，不复制也不修改传入的DataFrame
+        # 普通列整列用str.translate转义；筛选列取值重复度高，走带缓存的escape_html
+        escaped = {col: df[col].astype(str).str.translate(HTML_ESCAPE_TABLE)
+                   for col in cols if col not in filter_cols}
+        col_arrs = {col: values.to_numpy() for col, values in escaped.items()}
+        for col in filter_cols:
+            if col in cols:
+                col_arrs[col] = [escape_html(val) for val in df[col].to_numpy()]
 
         # 处理链接列
-        if link_col in df_html.columns:
-            df_html[link_col] = df_html[link_col].apply(
-                lambda x: f'<a href="{x}" target="_blank" class="link">{x}</a>'
-                if x not in ["无有效ID", "无数据", "未知"] and x.startswith("http")
-                else x
+        if link_col in escaped:
+            links = escaped[link_col]
+            valid = links.str.startswith("http") & ~links.isin(["无有效ID", "无数据", "未知"])
+            col_arrs[link_col] = np.where(
+                valid,
+                '<a href="' + links + '" target="_blank" class="link">' + links + '</a>',
+                links
             )
 
         # 处理标题列（添加新增标记）
-        if unique_key in df_html.columns and 'is_new' in df_html.columns:
-            df_html[unique_key] = df_html.apply(
-                lambda row: f"{row[unique_key]}<span class='new-label'>[新增]</span>"
-                if row['is_new'] else row[unique_key],
-                axis=1
+        if unique_key in escaped and 'is_new' in df.columns:
+            titles = escaped[unique_key]
+            col_arrs[unique_key] = np.where(
+                is_new_arr,
+                titles + "<span class='new-label'>[新增]</span>",
+                titles
             )
 
-        # 生成表格HTML
-        rows = []
-        # 添加表头
+        # 表头
         headers = []
         sort_indicator = f' <span class="time-sort-indicator" id="sort-indicator-{table_id}"></span>'
-        for col in df_html.columns:
-            if col not in ['is_new', f'{time_col}_parsed']:
-                if col == time_col:
-                    headers.append(f"<th>{col}{sort_indicator}</th>")
-                else:
-                    headers.append(f"<th>{col}</th>")
-        rows.append(f"<thead><tr>{''.join(headers)}</tr></thead>")
-
-        # 添加表体
-        rows.append("<tbody id='tbody-" + table_id + "'>")
-        for idx, row in df_html.iterrows():
-            row_class = "new-row" if row.get('is_new', False) else ""
-
+        for col in cols:
+            if col == time_col:
+                headers.append(f"<th>{col}{sort_indicator}</th>")
+            else:
+                headers.append(f"<th>{col}</th>")
+
+        # 表体（按列取出数组后逐行zip，避免iterrows为每行构造Series）
+        # 筛选列的data属性名和取值数组提前算好，行循环中只按下标取值
+        filter_arrs = [(f'data-{col.lower().replace(" ", "-")}', col_arrs[col])
+                       for col in filter_cols if col in col_arrs]
+        has_time = parsed_col in df.columns
+        if has_time:
+            # 整列一次性换算为秒级时间戳，无法解析的时间记为0
+            # 按毫秒精度换算：纳秒精度只能表示1677~2262年，超出范围的日期会导致转换失败
+            parsed = df[parsed_col]
+            ts_arr = parsed.astype('datetime64[ms]').to_numpy().view('int64') / 1e3
+            ts_arr[parsed.isna().to_numpy()] = 0
+            time_arr = col_arrs[time_col]
+
+        def build_row(i, values):
             # 构建行的data属性
-            data_attrs = []
-            for col in filter_cols:
-                if col in df_html.columns:
-                    data_attrs.append(f'data-{col.lower().replace(" ", "-")}="{row[col]}"')
-            data_attrs.append(f'data-is-new="{str(row.get("is_new", False)).lower()}"')
+            data_attrs = [f'{attr}="{arr[i]}"' for attr, arr in filter_arrs]
+            data_attrs.append(f'data-is-new="{str(is_new_arr[i]).lower()}"')
 
             # 添加时间戳属性（用于排序）
-            if f'{time_col}_parsed' in df_html.columns:
-                time_val = row[f'{time_col}_parsed']
-                timestamp = pd.Timestamp(time_val).timestamp() if pd.notna(time_val) else 0
-                data_attrs.append(f'data-timestamp="{timestamp}"')
-                data_attrs.append(f'data-time-orig="{row[time_col]}"')
-
-            # 构建单元格
-            cells = []
-            for col in df_html.columns:
-                if col not in ['is_new', f'{time_col}_parsed']:
-                    cells.append(f"<td>{row[col]}</td>")
-
-            rows.append(
-                f"<tr class='{row_class}' {' '.join(data_attrs)} id='{table_id}-row-{idx}'>{''.join(cells)}</tr>")
-        rows.append("</tbody>")
-
-        # 拼接表格HTML
-        table_html = f"<table id='{table_id}-table'>{''.join(rows)}</table>"
-
-        # 组合筛选控件和表格
-        filter_html = generate_filter_controls(df, table_id, filter_cols, time_col)
-        full_html = f"""
-        <div id='{table_id}-wrapper'>
-            {filter_html}
-            {table_html if not df.empty else '<p style="color:#7f8c8d; text-align:center;">暂无数据</p>'}
-        </div>
-        """
-        return full_html
+            if has_time:
+                data_attrs.append(f'data-timestamp="{ts_arr[i]}"')
+                data_attrs.append(f'data-time-orig="{time_arr[i]}"')
+
+            return ROW_TMPL.format(
+                cls="new-row" if is_new_arr[i] else "",
+                attrs=" ".join(data_attrs),
+                tid=table_id,
+                i=i,
+                cells="".join(CELL_TMPL.format(val) for val in values)
+            )
 
-    # 生成表格HTML
+        # 组合筛选控件和表格（逐段yield，由调用方直接写入文件，不拼接成整个字符串）
+        yield f"\n        <div id='{table_id}-wrapper'>\n            "
+        yield generate_filter_controls(df, table_id, filter_cols, time_col)
+        yield "\n            "
+        if df.empty:
+            yield '<p style="color:#7f8c8d; text-align:center;">暂无数据</p>'
+        else:
+            yield f"<table id='{table_id}-table'><thead><tr>{''.join(headers)}</tr></thead>"
+            yield "<tbody id='tbody-" + table_id + "'>"
+            yield from (build_row(i, values)
+                        for i, values in enumerate(zip(*[col_arrs[col] for col in cols])))
+            yield "</tbody></table>"
+        yield "\n        </div>\n        "
+
+    # 生成表格HTML（生成器，写文件时才逐段产出）
     notice_html = df_to_html_with_features(
         df_notice,
         table_id="notice",
@@ -540,8 +626,8 @@ def generate_online_html_table():
     </script>
     """
 
-    # 8. 组合完整HTML
-    full_html = f"""
+    # 8. 组合完整HTML（按顺序分段，表格部分由生成器流式产出）
+    head_html = f"""
     <!DOCTYPE html>
     <html lang="zh-CN">
     <head>
@@ -556,12 +642,14 @@ def generate_online_html_table():
 
             <div class="table-container">
                 <h2>一、采购公告</h2>
-                {notice_html}
+                """
+    mid_html = """
             </div>
 
             <div class="table-container">
                 <h2>二、采购意向公告</h2>
-                {intention_html}
+                """
+    tail_html = f"""
             </div>
 
             <div class="metadata">
@@ -576,14 +664,22 @@ def generate_online_html_table():
 
     # 9. 保存HTML文件
     try:
-        with open(CONFIG["html_output_path"], "w", encoding="utf-8") as f:
-            f.write(full_html)
+        # 先写入临时文件再原子替换，避免读取方看到写了一半的HTML
+        tmp_path = CONFIG["html_output_path"] + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                f.writelines(chain([head_html], notice_html, [mid_html], intention_html, [tail_html]))
+            os.replace(tmp_path, CONFIG["html_output_path"])
+        finally:
+            # 表格生成或写入中途出错时清理临时文件，已有的HTML保持不变
+            Path(tmp_path).unlink(missing_ok=True)
         print(f"✅ HTML表格已生成：{CONFIG['html_output_path']}")
 
         # 更新历史数据
-        save_history_data(current_notice_titles, current_intention_titles)
+        save_history_data(current_notice_titles, current_intention_titles, notice_sig, intention_sig, script_sig)
 
-    except Exception as e:
+    except OSError as e:
+        # 只处理文件读写错误；表格生成出错时直接抛出，让运行以非零状态退出
         print(f"❌ 保存HTML失败：{str(e)}")
 
 